@@ -1,7 +1,5 @@
-from __future__ import print_function, unicode_literals
-
 from collections import Counter
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class GitHubRepoAnalyzer():
@@ -33,19 +31,14 @@ class GitHubRepoAnalyzer():
         Returns:
             collections.Counter: Contributors counter.
         """
-        self.counters['contributors'] = Counter()
-
-        authors = []
-
-        for co in contributors:
-            author = (
-                co['author']['login']
-                if isinstance(co['author'], list) else
-                co['commit']['author']['name']
-            )
-            authors.append(author)
-
-        self.counters['contributors'].update(authors)
+        # Use GitHub login if commit author is linked to GitHub user
+        # or commit author name if author is null or empty
+        self.counters['contributors'] = Counter(
+            co['author']['login']
+            if co['author'] else
+            co['commit']['author']['name']
+            for co in contributors
+        )
 
         return self.counters['contributors']
 
@@ -62,33 +55,32 @@ class GitHubRepoAnalyzer():
         Returns:
             collections.Counter: Resource counter.
         """
-        self.counters[res_name] = Counter()
-        self.counters[res_name]['opened'] = 0
-        self.counters[res_name]['closed'] = 0
-        self.counters[res_name]['old'] = 0
+        # Count opened, closed and old resources in local variables
+        opened = closed = old = 0
+
+        # Resource is old if it has been opened more than `max_days` full days
+        cutoff = self._now - timedelta(days=max_days + 1)
 
         for res in resources:
             state = res['state']
-            created = datetime.strptime(
-                res['created_at'], '%Y-%m-%dT%H:%M:%SZ'
-            )
 
-            # Count opened, closed and old resources
             if state == 'open':
-                self.counters[res_name]['opened'] += 1
-
-                delta = (self._now - created).days
-                if delta > max_days:
-                    self.counters[res_name]['old'] += 1
+                opened += 1
+
+                # Only opened resources need creation date to be parsed,
+                # trailing `Z` of GitHub timestamp is stripped
+                # for `fromisoformat` before Python 3.11
+                created = datetime.fromisoformat(res['created_at'][:-1])
+                if created <= cutoff:
+                    old += 1
             elif state == 'closed':
-                self.counters[res_name]['closed'] += 1
+                closed += 1
 
         # Set counter to None if there is nothing to count
-        if (
-            not self.counters[res_name]['opened'] and
-            not self.counters[res_name]['closed'] and
-            not self.counters[res_name]['old']
-        ):
-            self.counters[res_name] = None
+        self.counters[res_name] = (
+            Counter(opened=opened, closed=closed, old=old)
+            if opened or closed or old else
+            None
+        )
 
         return self.counters[res_name]
@@ -1,9 +1,8 @@
-from __future__ import print_function, unicode_literals
-
-from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from heapq import nsmallest
 from unicodedata import normalize
 
-from .wrapper import GitHubAPIWrapper
+from .wrapper import DEFAULT_CACHE_PATH, GitHubAPIWrapper
 from .analyzer import GitHubRepoAnalyzer
 
 
@@ -26,10 +25,10 @@ class GitHubRepoAnalyzePresenter():
                  from_date=None, to_date=None, branch='master',
                  auth_token=None,
                  old_pulls_days=30, old_issues_days=14,
-                 contributors_max=30):
+                 contributors_max=30, cache_path=DEFAULT_CACHE_PATH):
         self.wrapper = GitHubAPIWrapper(
             repo_url, from_date=from_date, to_date=to_date, branch=branch,
-            auth_token=auth_token
+            auth_token=auth_token, cache_path=cache_path
         )
 
         # Catch possible formatting errors
@@ -81,97 +80,81 @@ class GitHubRepoAnalyzePresenter():
     def _create_contributors_list(self, contributors):
         """Create contributors list.
 
-        List of dicts with author as key and commits as value.
+        List of dicts with author as key and commits as value
+        for no more than `contributors_max` most active contributors.
 
         Args:
             collections.Counter: Contributors counter.
         """
-        for author, commits in self.counters['contributors'].items():
-            self.commits_sum += commits
-            contributor = {'author': author, 'commits': commits}
-            self.contributors_list.append(contributor)
-
-        # Sort contributors list by commits DESC and authors ASC
-        self.contributors_list = sorted(
-            self.contributors_list, key=itemgetter('author')
-        )
-        self.contributors_list = sorted(
-            self.contributors_list, key=itemgetter('commits'), reverse=True
+        self.commits_sum = sum(self.counters['contributors'].values())
+
+        # Select top contributors by commits DESC and authors ASC
+        # with a heap instead of sorting all of them
+        top = nsmallest(
+            self.contributors_max,
+            self.counters['contributors'].items(),
+            key=lambda x: (-x[1], x[0])
         )
 
-    def _safe_str(self, obj):
-        """Safe str for Python 2 backwards compatibility.
-
-        Returns the same string with Python 3.
-        Returns the string converted to ASCII symbols with Python 2.
-
-        Args:
-            obj (str): Input string.
-
-        Returns:
-            unicode|str: Output string.
-        """
-        try:
-            return normalize('NFC', str(obj))
-        except (UnicodeEncodeError, TypeError):
-            return normalize('NFKD', obj).encode(
-                'ascii', 'ignore'
-            ).decode('ascii')
-        return ''
+        # Build table rows for the selected contributors only
+        self.contributors_list = [
+            {
+                # Normalize non-ASCII names to get their length right
+                'author': (
+                    author if author.isascii() else normalize('NFC', author)
+                ),
+                'commits': commits,
+            }
+            for author, commits in top
+        ]
 
     def _print_table(self, data, cols=None):
         """Print a list of dictionaries as a dynamically sized table."""
         if not cols:
             cols = list(data[0].keys() if data else [])
-        lst = [cols]
-
-        output = ''
-
-        for item in data:
-            item['author'] = self._safe_str(item['author'])
-            lst.append([str(item[col.lower()] or '') for col in cols])
 
-        cols_size = [max(map(len, col)) for col in zip(*lst)]
+        rows = [[str(item[col.lower()] or '') for col in cols]
+                for item in data]
 
-        border_str = '-|-'.join(['-' * i for i in cols_size])
-        header_str = '=|='.join(['=' * i for i in cols_size])
+        cols_size = [max(map(len, col)) for col in zip(cols, *rows)]
 
-        row_str = ' | '.join(['{{:<{row}}}'.format(row=i) for i in cols_size])
+        border_str = '+-' + '-|-'.join(['-' * i for i in cols_size]) + '-+'
+        header_str = '+=' + '=|='.join(['=' * i for i in cols_size]) + '=+'
 
-        lst.insert(0, ['-' * i for i in cols_size])
-        lst.insert(2, ['-' * i for i in cols_size])
-        lst.append(['-' * i for i in cols_size])
+        row_str = '| ' + ' | '.join(
+            ['{{:<{row}}}'.format(row=i) for i in cols_size]
+        ) + ' |'
 
-        for num, item in enumerate(lst):
-            if num == 0:
-                output += '+-' + border_str.format(*cols_size) + '-+' + '\n'
-                continue
-            elif num == 2:
-                output += '+=' + header_str.format(*cols_size) + '=+' + '\n'
-                continue
-            elif num == len(lst) - 1:
-                output += '+-' + border_str.format(*cols_size) + '-+'
-                continue
+        output = [border_str, row_str.format(*cols), header_str]
+        output.extend([row_str.format(*row) for row in rows])
+        output.append(border_str)
 
-            output += '| ' + row_str.format(*item) + ' |' + '\n'
-
-        print(output)
+        print('\n'.join(output))
 
     def _prepare(self):
         """Summary"""
-        commits_data = self.wrapper.get_commits()
+        # Repository resources are independent - get them concurrently,
+        # wrapper resources (e.g. responses cache) are closed after that
+        with self.wrapper, ThreadPoolExecutor(max_workers=3) as executor:
+            commits_future = executor.submit(self.wrapper.get_commits)
+            pulls_future = executor.submit(self.wrapper.get_resources, 'pulls')
+            issues_future = executor.submit(
+                self.wrapper.get_resources, 'issues'
+            )
+
+        commits_data = commits_future.result()
         # print('commits_data:', commits_data)
         if not isinstance(commits_data, list):
             print(commits_data['message'])
             return False
 
-        pulls_data = self.wrapper.get_resources('pulls')
+        pulls_data = pulls_future.result()
         # print('pulls_data:', pulls_data)
         if not isinstance(pulls_data, list):
             print(pulls_data['message'])
             return False
 
-        issues_data = self.wrapper.get_resources('issues')
+        issues_data = issues_future.result()
         # print('issues_data:', issues_data)
         if not isinstance(issues_data, list):
             print(issues_data['message'])
@@ -223,10 +206,7 @@ class GitHubRepoAnalyzePresenter():
                 print('Commits:', self.commits_sum)
 
                 table_header = ('Author', 'Commits',)
-                self._print_table(
-                    self.contributors_list[:self.contributors_max],
-                    cols=table_header
-                )
+                self._print_table(self.contributors_list, cols=table_header)
             else:
                 print('No contributions found.')
 
@@ -1,18 +1,49 @@
-from __future__ import print_function, unicode_literals
-
-import json
+import base64
+import dbm
+import os
 import re
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-# Conditional urllib imports for both Python 2 and Python 3
+from http.client import HTTPSConnection, HTTPException, responses
+from urllib.parse import (
+    unquote, urlencode, urlparse, urlsplit, urlunsplit
+)
+from urllib.request import getproxies, proxy_bypass
+# Optional faster JSON library, parsers of both accept raw bytes
 try:
-    from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit
-    from urllib.request import urlopen, Request
-    from urllib.error import HTTPError
+    from orjson import dumps as json_dumps, loads as json_loads
 except ImportError:
-    from urlparse import parse_qsl, urlparse, urlsplit
-    from urllib import urlencode
-    from urllib2 import urlopen, Request, HTTPError
+    from json import dumps as _json_dumps, loads as json_loads
+
+    def json_dumps(obj):
+        return _json_dumps(obj).encode('utf-8')
+
+
+# GitHub REST API v3 host
+API_HOST = 'api.github.com'
+
+# Page number of the last page link in `Link` header
+_LAST_PAGE_RE = re.compile(r'[?&]page=(\d+)[^>]*>;\s*rel="last"')
+
+# Default on-disk responses cache in per-user cache directory
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or
+    os.path.join(os.path.expanduser('~'), '.cache'),
+    'github-repo-analyzer', 'responses'
+)
+
+# Cache key prefix of response storing time, kept apart from response data
+_STORED_AT_PREFIX = b'stored_at '
+
+# Lock for on-disk responses cache shared by all threads
+_cache_lock = threading.Lock()
+
+# Errors of unwritable, missing or corrupt on-disk responses cache
+# (`dbm.dumb` index is parsed with `ast.literal_eval`)
+_CACHE_ERRORS = (OSError, ValueError, SyntaxError) + dbm.error
 
 
 class GitHubAPIWrapper():
@@ -38,15 +69,39 @@ class GitHubAPIWrapper():
                 to_date (datetime.date|None): Date filtering ceiling.
                 branch (str): Project branch to analyze.
 
+        cache_path (str|None): On-disk `dbm` cache of responses (as JSON)
+            with their ETags to make conditional requests (disabled if None).
+            Responses unused for `cache_expire_after` seconds are dropped.
+
         exceptions (dict): Possible exceptions of parsing date filters.
 
             exceptions contents:
                 from_date (bool): If floor date exception has occured.
                 to_date (bool): If ceiling date exception has occured.
     """
+    # Max number of threads requesting pages of all resources
+    max_workers = 8
+
+    # Max number of concurrent requests of all resources
+    max_requests = 8
+
+    # Seconds to wait for connection or response
+    timeout = 30
+
+    # Retries of failed requests with exponential backoff (in seconds)
+    max_retries = 3
+    backoff_factor = 0.5
+    retry_statuses = (502, 503, 504)
+
+    # Redirects to follow (e.g. for renamed repositories)
+    redirect_statuses = (301, 302, 307)
+
+    # Seconds to keep unused cached responses
+    cache_expire_after = 24 * 60 * 60
+
     def __init__(self, repo_url,
                  from_date=None, to_date=None, branch='master',
-                 auth_token=None):
+                 auth_token=None, cache_path=DEFAULT_CACHE_PATH):
         # Parse repository URL to validate and get its owner and title
         self.repo = {}
 
@@ -89,131 +144,495 @@ class GitHubAPIWrapper():
 
         self.filters['branch'] = branch
 
-        # Optional OAuth personal access token
-        self._auth_token = auth_token
+        # Request path prefix of repository API resources
+        self._base_path = '/repos/{owner}/{title}'.format(
+            owner=self.repo['owner'], title=self.repo['title']
+        )
 
-    def _compose_full_api_request_url(self, resource, qs=None):
-        """Compose full URL for a given API resource.
+        # Common request headers with optional OAuth personal access token
+        self._headers = {
+            'Accept': 'application/vnd.github.v3+json',
+            'User-Agent': 'github-repo-analyzer',
+        }
+        if auth_token:
+            self._headers['Authorization'] = 'token {}'.format(auth_token)
+
+        # Persistent (keep-alive) HTTPS connections, one per thread,
+        # all of them are tracked to be closed
+        self._local = threading.local()
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+
+        # Pages requesting thread pool shared by all resources
+        # to reuse its threads connections, created on the first request
+        self._executor = None
+
+        # Limit of concurrent requests shared by all threads
+        self._requests_limit = threading.BoundedSemaphore(self.max_requests)
+
+        # Stop all further requests once GitHub has banned any of them
+        self._banned = threading.Event()
+        self._ban_error = None
+
+        # HTTPS proxy from environment (`HTTPS_PROXY`, `NO_PROXY`)
+        # like `urlopen` does
+        proxy = getproxies().get('https')
+        self._proxy = (
+            urlsplit(proxy if '//' in proxy else '//' + proxy)
+            if proxy and not proxy_bypass(API_HOST) else
+            None
+        )
+
+        # On-disk responses cache opened once on the first request
+        self.cache_path = cache_path
+        self._cache = None
+        self._cache_opened = False
+
+    def _compose_api_request_path(self, resource, qs=None):
+        """Compose request path for a given API resource.
 
         Args:
             resource (str): API resource title.
             qs (dict, optional): Data for GET request query string.
 
         Returns:
-            str: Full URL for a given API resource.
+            str: Request path (with query string) for a given API resource.
         """
-        full_url = '{root}/repos/{owner}/{title}/{resource}'.format(
-            root='https://api.github.com',
-            owner=self.repo['owner'],
-            title=self.repo['title'],
-            resource=resource
-        )
+        path = '{}/{}'.format(self._base_path, resource)
 
         if qs:
-            qs = urlencode(qs)
-            full_url = '{}?{}'.format(full_url, qs)
+            path = '{}?{}'.format(path, urlencode(qs))
 
-        return full_url
+        return path
 
     def _get_pages_count(self, value):
         """Get Pages count parsed from a given `Link` header.
 
         Args:
-            value (str): Description
+            value (str): `Link` header value.
+
+        Returns:
+            int: Pages count (0 if there`s no link to the last page).
+        """
+        match = _LAST_PAGE_RE.search(value)
+
+        return int(match.group(1)) if match else 0
+
+    def _get_connection(self):
+        """Get persistent HTTPS connection of the current thread.
+
+        Returns:
+            HTTPSConnection: Connection to GitHub API host.
+        """
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            if self._proxy:
+                # Tunnel HTTPS connection through proxy with CONNECT
+                connection = HTTPSConnection(
+                    self._proxy.hostname, self._proxy.port,
+                    timeout=self.timeout
+                )
+
+                tunnel_headers = {}
+                if self._proxy.username:
+                    credentials = '{}:{}'.format(
+                        unquote(self._proxy.username),
+                        unquote(self._proxy.password or '')
+                    )
+                    tunnel_headers['Proxy-Authorization'] = 'Basic {}'.format(
+                        base64.b64encode(credentials.encode()).decode()
+                    )
+
+                connection.set_tunnel(API_HOST, headers=tunnel_headers)
+            else:
+                connection = HTTPSConnection(API_HOST, timeout=self.timeout)
+
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.add(connection)
+
+        return connection
+
+    def _drop_connection(self, connection):
+        """Close broken connection of the current thread.
+
+        Args:
+            connection (HTTPSConnection): Connection to drop.
+        """
+        connection.close()
+        self._local.connection = None
+
+        with self._connections_lock:
+            self._connections.discard(connection)
+
+    def _get_executor(self):
+        """Get pages requesting thread pool.
 
         Returns:
-            int: Pages count.
+            ThreadPoolExecutor: Thread pool shared by all resources.
         """
-        replace_chars = " '\""
+        with self._connections_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers
+                )
+
+            return self._executor
 
-        for val in re.split(", *<", value):
+    def _open_cache(self):
+        """Open the cache once per wrapper and drop expired responses.
+
+        Must be called with `_cache_lock` acquired.
+
+        Returns:
+            dbm object|None: Opened cache or None if it`s unavailable.
+        """
+        if not self._cache_opened:
+            self._cache_opened = True
+
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+
+            cache = dbm.open(self.cache_path, 'c', 0o600)
             try:
-                url, params = val.split(";", 1)
-            except ValueError:
-                url, params = val, ''
+                self._cache = self._prune_cache(cache)
+            except _CACHE_ERRORS:
+                cache.close()
+                raise
+
+        return self._cache
+
+    def _prune_cache(self, cache):
+        """Drop expired responses and rewrite the cache if there`re any.
+
+        Rewriting the cache from scratch reclaims space of dropped responses,
+        which some dbm backends (e.g. `dbm.dumb`) never do by themselves.
+
+        Args:
+            cache (dbm object): Opened cache.
+
+        Returns:
+            dbm object: Opened pruned cache.
+        """
+        expire_at = time.time() - self.cache_expire_after
+
+        keys = set(cache.keys())
+        live_keys = set()
+
+        for key in keys:
+            if key.startswith(_STORED_AT_PREFIX):
+                path = key[len(_STORED_AT_PREFIX):]
+                if path in keys and int(cache[key]) > expire_at:
+                    live_keys.update((key, path))
+
+        if live_keys == keys:
+            return cache
+
+        entries = {key: cache[key] for key in live_keys}
+        cache.close()
+
+        cache = dbm.open(self.cache_path, 'n', 0o600)
+        for key, value in entries.items():
+            cache[key] = value
+
+        return cache
+
+    def close(self):
+        """Close thread pool, HTTPS connections and on-disk responses cache.
+
+        All of them are opened again on the next request.
+        """
+        with self._connections_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
 
-            link = {}
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
 
-            link['url'] = url.strip("<> '\"")
+            # Forget closed connections of all threads
+            self._local = threading.local()
 
-            for param in params.split(";"):
-                try:
-                    key, value = param.split("=")
-                except ValueError:
-                    break
+        with _cache_lock:
+            if self._cache is not None:
+                self._cache.close()
 
-                link[key.strip(replace_chars)] = value.strip(replace_chars)
-                parsed_result = dict(parse_qsl(urlsplit(link['url']).query))
+            self._cache = None
+            self._cache_opened = False
 
-                if link['rel'] == 'last':
-                    pages_count = int(parsed_result['page'])
+    def __enter__(self):
+        return self
 
-        return pages_count
+    def __exit__(self, *exc_info):
+        self.close()
 
-    def _api_request(self, url, method='GET', qs=None):
-        """Wrapper for requests to API resources.
+    def _cache_get(self, path):
+        """Get cached response for a given request path.
 
         Args:
-            url (str): A given API resource URL.
-            method (str): HTTP method (HEAD, GET).
-            qs (dict, optional): Query string.
+            path (str): Request path with query string.
 
         Returns:
-            list|dict: Response object parsed from JSON.
+            dict|None: Cached `etag`, `pages_count`, `stored_at` and `data`
+                or None if not cached or cache is unavailable.
+        """
+        if not self.cache_path:
+            return None
+
+        # Make uncached request if cache can`t be read
+        try:
+            with _cache_lock:
+                cache = self._open_cache()
+                value = cache.get(path.encode()) if cache is not None else None
+
+            return json_loads(value) if value else None
+        except _CACHE_ERRORS:
+            return None
+
+    def _cache_set(self, path, etag, data, pages_count):
+        """Store response for a given request path.
+
+        Args:
+            path (str): Request path with query string.
+            etag (str): Response `ETag` header.
+            data (list|dict): Response object parsed from JSON.
+            pages_count (int): Pages count parsed from `Link` header.
+        """
+        if not self.cache_path:
+            return
+
+        stored_at = int(time.time())
+        value = json_dumps({
+            'etag': etag,
+            'pages_count': pages_count,
+            'stored_at': stored_at,
+            'data': data,
+        })
+
+        # Skip caching if cache can`t be written
+        try:
+            with _cache_lock:
+                cache = self._open_cache()
+                if cache is not None:
+                    cache[path.encode()] = value
+                    cache[_STORED_AT_PREFIX + path.encode()] = str(stored_at)
+        except _CACHE_ERRORS:
+            pass
+
+    def _cache_renew(self, path):
+        """Renew expiration time of cached response for a given request path.
+
+        Only small storing time entry is rewritten, not the response itself.
+
+        Args:
+            path (str): Request path with query string.
+        """
+        try:
+            with _cache_lock:
+                cache = self._open_cache()
+                if cache is not None:
+                    cache[_STORED_AT_PREFIX + path.encode()] = str(
+                        int(time.time())
+                    )
+        except _CACHE_ERRORS:
+            pass
+
+    def _send_request(self, path, headers=None):
+        """Send GET request over a persistent connection with retries.
+
+        Broken connections (e.g. closed by server) are reopened: straight away
+        for the first time and with exponential backoff then. Responses with
+        `retry_statuses` are retried with exponential backoff as well.
+        Redirects within GitHub API host are followed.
+
+        Args:
+            path (str): Request path with query string.
+            headers (dict, optional): Additional request headers.
+
+        Returns:
+            tuple: Response object and its body (bytes).
+
+        Raises:
+            HTTPException|OSError: If all retries have failed.
+        """
+        headers = dict(self._headers, **headers) if headers else self._headers
+
+        attempt = 0
+        reconnected = False
+
+        while True:
+            connection = self._get_connection()
+
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                # Read the whole body to make the connection reusable
+                body = response.read()
+            except (HTTPException, OSError):
+                self._drop_connection(connection)
+
+                if attempt >= self.max_retries:
+                    raise
+
+                # Usually keep-alive connection has been closed by server
+                if not reconnected:
+                    reconnected = True
+                    attempt += 1
+                    continue
+            else:
+                if attempt >= self.max_retries:
+                    return response, body
+
+                location = urlsplit(response.getheader('Location', ''))
+
+                if (
+                    response.status in self.redirect_statuses and
+                    location.netloc == API_HOST
+                ):
+                    path = urlunsplit(
+                        ('', '', location.path, location.query, '')
+                    )
+                    attempt += 1
+                    continue
+
+                if response.status not in self.retry_statuses:
+                    return response, body
+
+            time.sleep(self.backoff_factor * 2 ** attempt)
+            attempt += 1
+
+    def _api_request(self, path):
+        """Wrapper for GET requests to API resources.
+
+        Args:
+            path (str): A given API resource request path with query string.
+
+        Returns:
+            tuple: Response object parsed from JSON (list|dict)
+                and pages count parsed from `Link` header (int).
 
         Returns in case of error:
-            dict: Error information.
+            tuple: Error information (dict) and 0 pages count.
 
             dict contents:
                 * `success` (bool): `False` for error response.
                 * `message` (str): Error message.
         """
-        full_url = self._compose_full_api_request_url(url, qs=qs)
+        # Don`t make requests of any resource after the ban
+        if self._banned.is_set():
+            return self._ban_error, 0
 
-        # Optional OAuth authorization token
+        # Make conditional request if the response has been cached
         headers = {}
-        if self._auth_token:
-            headers['Authorization'] = 'token {}'.format(self._auth_token)
+        cached = self._cache_get(path)
+        if cached:
+            headers['If-None-Match'] = cached['etag']
 
-        # Ugly workaround for Python 2 `(
         try:
-            request = Request(full_url, method=method, headers=headers)
-        except TypeError:
-            request = Request(full_url, headers=headers)
-            request.get_method = lambda: method
+            with self._requests_limit:
+                response, body = self._send_request(path, headers=headers)
+        except (HTTPException, OSError) as e:
+            error = {
+                'success': False,
+                'code': None,
+                'message': 'Network error: {}.'.format(e),
+            }
+            return error, 0
 
-        try:
-            response = urlopen(request)
-        except HTTPError as e:
-            message = ('{message}.'.format(message=e))
+        # Resource hasn`t been changed since the cached response
+        if response.status == 304 and cached:
+            self._cache_renew(path)
+            return cached['data'], cached['pages_count']
 
-            if e.code == 403:
+        if response.status >= 300:
+            message = 'HTTP Error {code}: {reason}.'.format(
+                code=response.status,
+                reason=response.reason or responses.get(response.status, '')
+            )
+
+            if response.status == 403:
                 ban_info = 'You`ve been banned by GitHub. ' \
                            'Wait a while or use -a for OAuth access token.'
                 message = '{}\n{}'.format(message, ban_info)
 
-            response = {
+            error = {
                 'success': False,
-                'code': e.code,
+                'code': response.status,
                 'message': message,
             }
-            return response
-        else:
-            if method == 'HEAD':
-                try:
-                    link_header = response.info().dict.get('link', None)
-                except AttributeError:
-                    link_header = response.getheader('Link')
-
-                pages_count = (
-                    self._get_pages_count(link_header) if
-                    link_header else
-                    0
-                )
 
-                return pages_count
+            if response.status == 403:
+                self._ban_error = error
+                self._banned.set()
+
+            return error, 0
+
+        link_header = response.getheader('Link')
+
+        pages_count = (
+            self._get_pages_count(link_header) if
+            link_header else
+            0
+        )
+
+        data = json_loads(body)
+
+        etag = response.getheader('ETag')
+        if etag:
+            self._cache_set(path, etag, data, pages_count)
+
+        return data, pages_count
+
+    def _get_pages(self, path):
+        """Get all pages of a given API resource.
+
+        The first page is requested straight away, its `Link` header
+        gives pages count, and the rest pages are requested concurrently.
+
+        Args:
+            path (str): Request path with query string without page number.
+
+        Returns:
+            list: Resource items from all pages in the page order.
+
+        Returns in case of error:
+            dict: Error information of the first failed page.
+        """
+        items, pages_count = self._api_request(path)
+
+        # Catch possible mistyped URLs or other network issues
+        if isinstance(items, dict) and not items['success']:
+            return items
+
+        # If there`s no more pages - return the first page only
+        if pages_count < 2:
+            return items
+
+        # Query string is composed once, only page number is appended
+        page_path = '{}{}page={{}}'.format(path, '&' if '?' in path else '?')
 
-            return json.loads(response.read().decode('utf-8'))
+        executor = self._get_executor()
+        futures = [
+            executor.submit(self._api_request, page_path.format(page))
+            for page in range(2, pages_count + 1)
+        ]
+
+        for future in futures:
+            result, _ = future.result()
+
+            # Stop fanning out requests on the first error (e.g. ban)
+            if isinstance(result, dict) and not result['success']:
+                for f in futures:
+                    f.cancel()
+                return result
+
+            items += result
+
+        return items
 
     def get_commits(self):
         """Get commits list for a given repository.
@@ -232,7 +651,7 @@ class GitHubAPIWrapper():
                 * `success` (bool): `False` for error response.
                 * `message` (str): Error message.
         """
-        # Compose HEAD request to get pagination info
+        # Compose commits API request
         qs = {}
         qs['per_page'] = 100
 
@@ -246,24 +665,10 @@ class GitHubAPIWrapper():
             )
         qs['sha'] = self.filters['branch']
 
-        # Get pages count for possible request pagination
-        pages_count = self._api_request('commits', method='HEAD', qs=qs)
+        path = self._compose_api_request_path('commits', qs=qs)
 
-        # Catch possible mistyped URLs or other network issues
-        if isinstance(pages_count, dict) and not pages_count['success']:
-            return pages_count
-
-        commits = []
-
-        # If pages count exists - make requests for every page
-        if pages_count > 0:
-            for page in range(pages_count):
-                qs['page'] = page + 1
-                co = self._api_request('commits', qs=qs)
-                commits += co
-        # If there`s no pages count - make one request
-        else:
-            commits = self._api_request('commits', qs=qs)
+        # Get all pages for possible request pagination
+        commits = self._get_pages(path)
 
         # print('commits len:', len(commits))
 
@@ -299,24 +704,10 @@ class GitHubAPIWrapper():
             )
         qs['base'] = self.filters['branch']  # `head` or `base` ?
 
-        # Get pages count for possible request pagination
-        pages_count = self._api_request(res_name, method='HEAD', qs=qs)
+        path = self._compose_api_request_path(res_name, qs=qs)
 
-        # Catch possible mistyped URLs or other network issues
-        if isinstance(pages_count, dict) and not pages_count['success']:
-            return pages_count
-
-        resources = []
-
-        # If pages count exists - make requests for every page
-        if pages_count > 0:
-            for page in range(pages_count):
-                qs['page'] = page + 1
-                res = self._api_request(res_name, qs=qs)
-                resources += res
-        # If there`s no pages count - make one request
-        else:
-            resources = self._api_request(res_name, qs=qs)
+        # Get all pages for possible request pagination
+        resources = self._get_pages(path)
 
         # print('{} len:'.format(res_name), len(resources))
 
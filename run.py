@@ -1,13 +1,8 @@
 import argparse
 import sys
 
-# Input workaround for Python 2
-try:
-    input = raw_input
-except NameError:
-    pass
-
 from github_repo_analyzer.presenter import GitHubRepoAnalyzePresenter
+from github_repo_analyzer.wrapper import DEFAULT_CACHE_PATH
 
 
 __author__ = 'Michail Vasilyev (vmm86) https://github.com/vmm86'
@@ -85,6 +80,23 @@ if __name__ == '__main__':
         default=False
     )
 
+    parser.add_argument(
+        '-d',  # '--cache-path',
+        dest='cache_path',
+        metavar='cache_path',
+        help='Optional path of responses cache '
+             '(in per-user cache directory by default)',
+        action='store',
+        default=DEFAULT_CACHE_PATH
+    )
+    parser.add_argument(
+        '-n',  # '--no-cache',
+        dest='no_cache',
+        help='Optional flag to disable responses cache',
+        action='store_true',
+        default=False
+    )
+
     # Parse command line arguments
     args = parser.parse_args()
 
@@ -97,6 +109,8 @@ if __name__ == '__main__':
         'old_issues_days': args.old_issues_days,
 
         'contributors_max': args.contributors_max,
+
+        'cache_path': None if args.no_cache else args.cache_path,
     }
 
     # Get optional access token from command line input